@@ -3,9 +3,10 @@ import asyncio
 import logging
 from telethon import TelegramClient, events
 from telethon.tl.types import MessageMediaPhoto, User, Chat, Channel
-from dotenv import load_dotenv
 from mistral_filter import filter_argentina_content
 from mistral_api import process_content_with_mistral
+from message_formatter import build_post
+from config import get_config, set_config, watch_config
 from collections import deque
 
 # Настройка логирования
@@ -19,23 +20,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
-
-# Учетные данные API Telegram
-API_ID = os.getenv('API_ID')
-API_HASH = os.getenv('API_HASH')
-SOURCE_GROUPS = os.getenv('SOURCE_GROUPS').split(',')
-TARGET_GROUP = os.getenv('TARGET_GROUP')
-
 # Создаем папку для временного хранения медиа файлов
 MEDIA_FOLDER = "temp_media"
 if not os.path.exists(MEDIA_FOLDER):
     os.makedirs(MEDIA_FOLDER)
     logger.info(f"Создана папка для временного хранения медиа: {MEDIA_FOLDER}")
 
-# Инициализация клиента Telegram
-client = TelegramClient('argentina_news_bot', API_ID, API_HASH)
+# Инициализация клиента Telegram (учетные данные API не перезагружаются на лету)
+client = TelegramClient('argentina_news_bot', get_config().api_id, get_config().api_hash)
 
 # Отслеживание обработанных сообщений для избежания дубликатов (ограничение до 1000 сообщений)
 processed_messages = deque(maxlen=1000)
@@ -108,27 +100,44 @@ async def process_message(message):
         processed_messages.append(message.id)
         logger.info(f"Сообщение ID: {message.id} добавлено в список обработанных")
         
-        # Форматируем контент с использованием Markdown
-        lines = processed_content.split('\n')
-        if lines and lines[0]:
-            # Удаляем символы ### из заголовка, если они есть
-            if lines[0].startswith('###'):
-                lines[0] = lines[0].replace('###', '').strip()
-            
-            # Проверяем, не содержит ли первая строка уже форматирование жирным шрифтом
-            if not (lines[0].startswith('**') and lines[0].endswith('**')):
-                lines[0] = f"**{lines[0]}**"
-            formatted_content = '\n'.join(lines)
-        else:
-            formatted_content = processed_content
-            
-        logger.info(f"Контент отформатирован с использованием Markdown")
+        # Форматируем контент: чистый текст с сущностями, разбитый по лимитам Telegram
+        post = build_post(processed_content, with_media=bool(media_path))
+        logger.info(f"Контент отформатирован, частей для отправки: {len(post)}")
         
-        return formatted_content, media_path, source_info
+        return post, media_path, source_info
     except Exception as e:
         logger.error(f"Ошибка при обработке сообщения ID: {message.id} из {source_info}: {e}")
         return None, None, None
 
+async def send_post(client, target_entity, post, media_path=None):
+    """Отправка подготовленного поста: первая часть с медиа или без, остальные - следом."""
+    if not post:
+        logger.warning("Пустой пост, отправлять нечего")
+        return
+    
+    first_text, first_entities = post[0]
+    if media_path:
+        await client.send_file(
+            target_entity,
+            media_path,
+            caption=first_text,
+            formatting_entities=first_entities
+        )
+    else:
+        await client.send_message(
+            target_entity,
+            first_text,
+            formatting_entities=first_entities
+        )
+    
+    # Продолжение текста, не поместившееся в подпись или одно сообщение
+    for text, entities in post[1:]:
+        await client.send_message(
+            target_entity,
+            text,
+            formatting_entities=entities
+        )
+
 async def get_entity_safely(client, entity_id):
     """Безопасное получение сущности по ID или имени пользователя."""
     logger.info(f"Попытка получения сущности: {entity_id}")
@@ -156,19 +165,14 @@ async def get_entity_safely(client, entity_id):
         logger.error(f"Ошибка при получении сущности {entity_id}: {e}")
         return None
 
-async def main():
-    """Основная функция для запуска бота."""
-    logger.info("Запуск бота...")
-    await client.start()
-    logger.info("Бот успешно запущен!")
-    
-    # Получаем сущности для исходных групп
-    source_entities = []
-    for group_id in SOURCE_GROUPS:
+async def resolve_source_entities(client, source_groups):
+    """Получение сущностей для исходных групп. Возвращает словарь {группа: сущность}."""
+    source_entities = {}
+    for group_id in source_groups:
         logger.info(f"Подключение к исходной группе: {group_id}")
         entity = await get_entity_safely(client, group_id)
         if entity:
-            source_entities.append(entity)
+            source_entities[group_id] = entity
             # Проверяем тип сущности и используем соответствующие атрибуты
             if isinstance(entity, User):
                 name = f"{entity.first_name} {entity.last_name if entity.last_name else ''}"
@@ -178,12 +182,18 @@ async def main():
         else:
             logger.error(f"Не удалось подключиться к исходной группе: {group_id}")
     
-    # Получаем сущность для целевой группы
-    logger.info(f"Подключение к целевой группе: {TARGET_GROUP}")
-    target_entity = await get_entity_safely(client, TARGET_GROUP)
+    dropped = [group_id for group_id in source_groups if group_id not in source_entities]
+    if dropped:
+        logger.warning(f"Исходные группы пропущены: {', '.join(dropped)}")
+    return source_entities
+
+async def resolve_target_entity(client, target_group):
+    """Получение сущности для целевой группы."""
+    logger.info(f"Подключение к целевой группе: {target_group}")
+    target_entity = await get_entity_safely(client, target_group)
     if not target_entity:
-        logger.error(f"Не удалось подключиться к целевой группе: {TARGET_GROUP}")
-        return
+        logger.error(f"Не удалось подключиться к целевой группе: {target_group}")
+        return None
     
     # Также проверяем тип целевой сущности
     if isinstance(target_entity, User):
@@ -191,9 +201,25 @@ async def main():
         logger.info(f"Успешно подключен к целевому пользователю: {name.strip()}")
     else:
         logger.info(f"Успешно подключен к целевой группе/каналу: {target_entity.title}")
+    return target_entity
+
+async def main():
+    """Основная функция для запуска бота."""
+    logger.info("Запуск бота...")
+    await client.start()
+    logger.info("Бот успешно запущен!")
     
-    # Регистрируем обработчик для новых сообщений
-    @client.on(events.NewMessage(chats=source_entities))
+    config = get_config()
+    source_entities = await resolve_source_entities(client, config.source_groups)
+    target_entity = await resolve_target_entity(client, config.target_group)
+    if not target_entity:
+        return
+    
+    # В настройках храним только группы, которые реально отслеживаются,
+    # чтобы при следующей перезагрузке попытаться подключить остальные
+    set_config(config._replace(source_groups=tuple(source_entities)))
+    
+    # Обработчик для новых сообщений
     async def handle_new_message(event):
         media_path = None
         try:
@@ -212,23 +238,10 @@ async def main():
                     # Отправка в целевую группу
                     if media_path:
                         logger.info(f"Отправка сообщения ID: {event.message.id} с медиа в целевую группу")
-                        # Отправляем с поддержкой Markdown
-                        await client.send_file(
-                            target_entity, 
-                            media_path, 
-                            caption=content,
-                            parse_mode='md'  # Включаем поддержку Markdown
-                        )
-                        logger.info(f"Сообщение ID: {event.message.id} с медиа успешно отправлено")
                     else:
                         logger.info(f"Отправка текстового сообщения ID: {event.message.id} в целевую группу")
-                        # Отправляем с поддержкой Markdown
-                        await client.send_message(
-                            target_entity, 
-                            content,
-                            parse_mode='md'  # Включаем поддержку Markdown
-                        )
-                        logger.info(f"Текстовое сообщение ID: {event.message.id} успешно отправлено")
+                    await send_post(client, target_entity, content, media_path)
+                    logger.info(f"Сообщение ID: {event.message.id} успешно отправлено, частей: {len(content)}")
                     
                     logger.info(f"Успешно обработано и переслано сообщение ID: {event.message.id} из {source_info}")
                 except Exception as e:
@@ -243,9 +256,54 @@ async def main():
                 os.remove(media_path)
                 logger.info(f"Медиа-файл {media_path} удален")
     
+    async def apply_config(old_config, new_config):
+        """Применение перезагруженных настроек без перезапуска клиента.
+        
+        Возвращает настройки с теми группами, которые действительно используются.
+        """
+        nonlocal target_entity
+        applied_config = new_config
+        
+        # Сначала получаем все сущности, чтобы затем заменить их без пауз
+        new_source_entities = None
+        if new_config.source_groups != old_config.source_groups:
+            new_source_entities = await resolve_source_entities(client, new_config.source_groups)
+            if new_source_entities:
+                applied_config = applied_config._replace(source_groups=tuple(new_source_entities))
+            else:
+                logger.error("Не удалось подключиться ни к одной исходной группе, оставляем прежний список")
+                applied_config = applied_config._replace(source_groups=old_config.source_groups)
+                new_source_entities = None
+        
+        new_target_entity = None
+        if new_config.target_group != old_config.target_group:
+            new_target_entity = await resolve_target_entity(client, new_config.target_group)
+            if not new_target_entity:
+                logger.error("Оставляем прежнюю целевую группу")
+                applied_config = applied_config._replace(target_group=old_config.target_group)
+        
+        # Между снятием и установкой фильтра нет await, поэтому ни одно обновление не теряется,
+        # а уже запущенные обработчики дорабатывают как обычно
+        if new_source_entities is not None:
+            client.remove_event_handler(handle_new_message, events.NewMessage)
+            client.add_event_handler(handle_new_message, events.NewMessage(chats=list(new_source_entities.values())))
+            logger.info(f"Список исходных групп обновлен: {len(new_source_entities)} шт.")
+        if new_target_entity:
+            target_entity = new_target_entity
+        return applied_config
+    
+    # Регистрируем обработчик для новых сообщений
+    client.add_event_handler(handle_new_message, events.NewMessage(chats=list(source_entities.values())))
+    
+    # Следим за изменениями настроек
+    config_watcher = asyncio.ensure_future(watch_config(apply_config))
+    
     logger.info("Бот запущен и ожидает новые сообщения...")
-    # Запуск клиента до отключения
-    await client.run_until_disconnected()
+    try:
+        # Запуск клиента до отключения
+        await client.run_until_disconnected()
+    finally:
+        config_watcher.cancel()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,214 @@
+import os
+import asyncio
+import signal
+import logging
+from collections import namedtuple
+from dotenv import dotenv_values, find_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Файл .env ищется от каталога бота, а не от текущего рабочего каталога
+ENV_PATH = find_dotenv() or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+# Интервал проверки изменений файла .env в секундах
+RELOAD_INTERVAL = 5
+
+Config = namedtuple('Config', [
+    'api_id',
+    'api_hash',
+    'source_groups',
+    'target_group',
+    'mistral_api_key',
+    'mistral_api_key_filter',
+    'filter_prompt',
+    'content_prompt',
+    'filter_model',
+    'content_model',
+    'filter_max_tokens',
+    'content_max_tokens',
+])
+
+# Параметры, смена которых требует перезапуска (сессия Telegram)
+RESTART_REQUIRED = ('api_id', 'api_hash')
+
+_KEYS = (
+    'API_ID', 'API_HASH', 'SOURCE_GROUPS', 'TARGET_GROUP',
+    'MISTRAL_API_KEY', 'MISTRAL_API_KEY_FILTER',
+    'FILTER_PROMPT', 'CONTENT_PROMPT',
+    'FILTER_MODEL', 'CONTENT_MODEL',
+    'FILTER_MAX_TOKENS', 'CONTENT_MAX_TOKENS',
+)
+
+_config = None
+
+
+def _parse_max_tokens(values, key, default):
+    raw = values.get(key) or default
+    try:
+        max_tokens = int(raw)
+    except ValueError:
+        raise ValueError(f"{key} must be an integer, got {raw!r}")
+    if max_tokens <= 0:
+        raise ValueError(f"{key} must be positive, got {max_tokens}")
+    return max_tokens
+
+
+def _check_prompt(values, key, **placeholders):
+    prompt = values.get(key)
+    if not prompt:
+        raise ValueError(f"{key} is not set")
+    try:
+        prompt.format(**placeholders)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"{key} is invalid, expected placeholders {sorted(placeholders)}: {e}")
+    return prompt
+
+
+def load_config(path=ENV_PATH):
+    """Чтение и проверка настроек из файла .env.
+
+    Как и load_dotenv(), переменные окружения имеют приоритет над файлом.
+    При ошибке в настройках выбрасывается ValueError.
+    """
+    values = {key: value for key, value in dotenv_values(path).items() if value is not None}
+    values.update({key: os.environ[key] for key in _KEYS if key in os.environ})
+
+    missing = [key for key in ('API_ID', 'API_HASH', 'SOURCE_GROUPS', 'TARGET_GROUP',
+                               'MISTRAL_API_KEY', 'MISTRAL_API_KEY_FILTER') if not values.get(key)]
+    if missing:
+        raise ValueError(f"Missing required settings: {', '.join(missing)}")
+
+    source_groups = tuple(group.strip() for group in values['SOURCE_GROUPS'].split(',') if group.strip())
+    if not source_groups:
+        raise ValueError("SOURCE_GROUPS is empty")
+
+    return Config(
+        api_id=values['API_ID'],
+        api_hash=values['API_HASH'],
+        source_groups=source_groups,
+        target_group=values['TARGET_GROUP'].strip(),
+        mistral_api_key=values['MISTRAL_API_KEY'],
+        mistral_api_key_filter=values['MISTRAL_API_KEY_FILTER'],
+        filter_prompt=_check_prompt(values, 'FILTER_PROMPT', text=''),
+        content_prompt=_check_prompt(values, 'CONTENT_PROMPT', title='', article_content=''),
+        filter_model=values.get('FILTER_MODEL') or 'mistral-large-latest',
+        content_model=values.get('CONTENT_MODEL') or 'mistral-large-latest',
+        filter_max_tokens=_parse_max_tokens(values, 'FILTER_MAX_TOKENS', 10),
+        content_max_tokens=_parse_max_tokens(values, 'CONTENT_MAX_TOKENS', 800),
+    )
+
+
+def get_config():
+    """Текущие настройки. Объект неизменяемый, при перезагрузке он заменяется целиком."""
+    global _config
+    if _config is None:
+        _config = load_config()
+    return _config
+
+
+def set_config(config):
+    """Замена текущих настроек, например на фактически примененные при запуске."""
+    global _config
+    _config = config
+
+
+async def reload_config(on_reload=None, path=ENV_PATH):
+    """Повторное чтение настроек и атомарная замена текущего объекта.
+
+    on_reload(old_config, new_config) применяет изменения и может вернуть
+    настройки, которые удалось применить на деле (например, без групп, к которым
+    не удалось подключиться). Сохраняются именно они, поэтому повторное чтение
+    того же файла снова попытается применить недостающее. При ошибке в новом
+    файле или при применении продолжаем работать со старыми настройками.
+    """
+    global _config
+    old_config = get_config()
+    try:
+        new_config = load_config(path)
+    except Exception as e:
+        logger.error(f"Ошибка в настройках {path}, продолжаем со старыми: {e}")
+        return None
+
+    if new_config == old_config:
+        logger.info("Настройки не изменились")
+        return None
+
+    for field in RESTART_REQUIRED:
+        if getattr(new_config, field) != getattr(old_config, field):
+            logger.warning(f"Изменение {field.upper()} вступит в силу только после перезапуска")
+            new_config = new_config._replace(**{field: getattr(old_config, field)})
+    if new_config == old_config:
+        return None
+
+    if on_reload:
+        try:
+            applied_config = await on_reload(old_config, new_config)
+        except Exception as e:
+            logger.error(f"Ошибка при применении новых настроек, продолжаем со старыми: {e}")
+            return None
+        if applied_config is not None:
+            new_config = applied_config
+
+    changed = [field for field in Config._fields if getattr(new_config, field) != getattr(old_config, field)]
+    _config = new_config
+    logger.info(f"Настройки перезагружены, изменено: {', '.join(changed) or 'ничего'}")
+    return new_config
+
+
+def _get_mtime(path):
+    """Время изменения файла или None, если файла нет (в том числе удален прямо сейчас)."""
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+async def watch_config(on_reload=None, path=ENV_PATH, interval=RELOAD_INTERVAL):
+    """Перезагрузка настроек при изменении файла .env или по сигналу SIGHUP."""
+    loop = asyncio.get_event_loop()
+    lock = asyncio.Lock()
+    # Ссылки на задачи, запущенные по сигналу, чтобы их не собрал сборщик мусора
+    signal_tasks = set()
+
+    async def reload():
+        # Не допускаем одновременной перезагрузки по сигналу и по файлу
+        async with lock:
+            try:
+                await reload_config(on_reload, path)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Непредвиденная ошибка при перезагрузке настроек: {e}")
+
+    def on_signal():
+        task = asyncio.ensure_future(reload())
+        signal_tasks.add(task)
+        task.add_done_callback(signal_tasks.discard)
+
+    try:
+        loop.add_signal_handler(signal.SIGHUP, on_signal)
+        logger.info("Перезагрузка настроек по сигналу SIGHUP включена")
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # SIGHUP недоступен (например, в Windows) - остается только проверка файла
+        logger.info("Сигнал SIGHUP недоступен, настройки перезагружаются только при изменении файла")
+
+    try:
+        last_mtime = _get_mtime(path)
+        while True:
+            await asyncio.sleep(interval)
+            # Одна неудачная проверка не должна останавливать слежение за настройками
+            try:
+                mtime = _get_mtime(path)
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    logger.info(f"Обнаружено изменение файла {path}, перезагрузка настроек")
+                    await reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка при проверке файла {path}: {e}")
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGHUP)
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass
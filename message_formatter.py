@@ -0,0 +1,208 @@
+import re
+import copy
+import logging
+from telethon.helpers import add_surrogate, del_surrogate
+from telethon.tl.types import (
+    MessageEntityBold, MessageEntityItalic, MessageEntityStrike,
+    MessageEntityCode, MessageEntityPre, MessageEntityTextUrl
+)
+
+logger = logging.getLogger(__name__)
+
+# Лимиты Telegram (считаются в единицах UTF-16)
+CAPTION_LIMIT = 1024
+MESSAGE_LIMIT = 4096
+
+# Регулярные выражения компилируются один раз при импорте модуля
+_HEADING_PREFIX_RE = re.compile(r'^[ \t]*#{1,6}[ \t]+')
+_INLINE_PATTERN = (
+    r'```(?:(?P<pre_lang>[\w+#.-]*)\n)?(?P<pre>[\s\S]+?)\n?```'
+    r'|`(?P<code>[^`\n]+)`'
+    r'|\[(?P<link_text>[^\]\n]+)\]\((?P<link>[^()\s]+)\)'
+    r'|\*\*\*(?P<bold_italic>[^\n]+?)\*\*\*'
+    r'|\*\*(?P<bold>[^\n]+?)\*\*'
+    r'|(?<!\w)__(?P<bold_alt>[^\s_](?:[^\n]*?[^\s_])?)__(?!\w)'
+    r'|(?<![\w*])\*(?P<italic>[^\s*](?:(?:\*\*[^\n*]+?\*\*|[^\n*])*?[^\s*])?)\*(?![\w*])'
+    r'|~~(?P<strike>[^\n]+?)~~'
+)
+_INLINE_RE = re.compile(_INLINE_PATTERN)
+_TOKEN_RE = re.compile(r'^[ \t]*#{1,6}[ \t]+(?P<heading>[^\n]*)$|' + _INLINE_PATTERN, re.MULTILINE)
+_ENTITY_TYPES = {
+    'bold_italic': (MessageEntityBold, MessageEntityItalic),
+    'bold': (MessageEntityBold,),
+    'bold_alt': (MessageEntityBold,),
+    'italic': (MessageEntityItalic,),
+    'strike': (MessageEntityStrike,),
+    'code': (MessageEntityCode,),
+}
+# Содержимое кода не разбирается, у ссылки текст лежит в отдельной группе
+_VERBATIM_KINDS = ('code', 'pre')
+_TEXT_GROUPS = {'link': 'link_text'}
+
+# Символы, перед которыми нельзя резать текст (в представлении add_surrogate)
+_ZWJ = '\u200d'
+_JOINING_CHARS = re.compile(r'[\u0300-\u036f\u200d\ufe0e\ufe0f\udc00-\udfff]')
+_SKIN_TONE_RE = re.compile(r'\ud83c[\udffb-\udfff]')
+_TAG_RE = re.compile(r'\udb40[\udc20-\udc7f]')
+_REGIONAL_INDICATOR_RE = re.compile(r'\ud83c[\udde6-\uddff]')
+_REGIONAL_RUN_RE = re.compile(r'(?:\ud83c[\udde6-\uddff])+')
+
+
+def _entities_for(match, kind, offset, length):
+    """Сущности для найденного фрагмента разметки."""
+    if not length:
+        return []
+    if kind == 'link':
+        return [MessageEntityTextUrl(offset=offset, length=length, url=match.group('link'))]
+    if kind == 'pre':
+        return [MessageEntityPre(offset=offset, length=length, language=match.group('pre_lang') or '')]
+    return [entity(offset=offset, length=length) for entity in _ENTITY_TYPES[kind]]
+
+
+def _parse_inline(text, offset, pattern=_INLINE_RE):
+    """Замена inline-разметки на сущности. offset - смещение text в итоговом тексте."""
+    parts = []
+    entities = []
+    length = offset
+
+    last = 0
+    for match in pattern.finditer(text):
+        chunk = text[last:match.start()]
+        parts.append(chunk)
+        length += len(chunk)
+
+        kind = match.lastgroup
+        if kind == 'heading':
+            inner, inner_entities = _parse_bold_line(match.group(kind), length)
+        elif kind in _VERBATIM_KINDS:
+            inner, inner_entities = match.group(kind), []
+        else:
+            # Вложенная разметка, например курсив внутри полужирного
+            inner, inner_entities = _parse_inline(match.group(_TEXT_GROUPS.get(kind, kind)), length)
+        if kind != 'heading':
+            entities.extend(_entities_for(match, kind, length, len(inner)))
+        entities.extend(inner_entities)
+        parts.append(inner)
+        length += len(inner)
+        last = match.end()
+    parts.append(text[last:])
+
+    return ''.join(parts), entities
+
+
+def _parse_bold_line(text, offset):
+    """Разбор строки, которая целиком выделяется полужирным (заголовок)."""
+    plain, entities = _parse_inline(text.strip(), offset)
+    # Полужирные фрагменты уже покрыты сущностью всей строки, оставляем только курсив
+    entities = [entity for entity in entities if not isinstance(entity, MessageEntityBold)]
+    if plain:
+        entities.insert(0, MessageEntityBold(offset=offset, length=len(plain)))
+    return plain, entities
+
+
+def _format(text):
+    """Преобразование Markdown от Mistral в чистый текст и сущности за один проход.
+
+    Текст должен быть уже переведен в UTF-16 через add_surrogate, чтобы
+    длины строк совпадали со смещениями, которые ожидает Telegram.
+    """
+    title, sep, body = text.partition('\n')
+    # Первая строка всегда заголовок: убираем ### перед ней и делаем ее полужирной
+    title, entities = _parse_bold_line(_HEADING_PREFIX_RE.sub('', title), 0)
+    body, body_entities = _parse_inline(body, len(title) + len(sep), _TOKEN_RE)
+    return title + sep + body, entities + body_entities
+
+
+def _can_break(text, start, position):
+    """Можно ли разрезать текст перед position, не разбивая составной символ.
+
+    start - начало текущей части, оно всегда приходится на границу символа.
+    """
+    if _JOINING_CHARS.match(text, position) or text[position - 1] == _ZWJ:
+        return False
+    if _SKIN_TONE_RE.match(text, position) or _TAG_RE.match(text, position):
+        return False
+    if _REGIONAL_INDICATOR_RE.match(text, position):
+        # Флаг - пара региональных индикаторов: резать можно только после четного их числа.
+        # Считаем только от начала части, иначе длинная цепочка флагов дает квадратичное время
+        run = None
+        for run in _REGIONAL_RUN_RE.finditer(text, start, position):
+            pass
+        if run and run.end() == position and (run.end() - run.start()) // 2 % 2:
+            return False
+    return True
+
+
+def _find_break(text, start, end):
+    """Поиск позиции разрыва: абзац, затем строка, затем пробел, иначе жесткий разрез."""
+    min_break = start + (end - start) // 2
+    for separator in ('\n\n', '\n', ' '):
+        position = text.rfind(separator, start, end)
+        if position > min_break:
+            return position
+    # Не разрезаем суррогатные пары, флаги и последовательности эмодзи с ZWJ
+    position = end
+    while position > start + 1 and not _can_break(text, start, position):
+        position -= 1
+    if position > start + 1:
+        return position
+    # Неразрывная последовательность длиннее лимита - режем хотя бы не посреди суррогатной пары
+    if '\ud800' <= text[end - 1] <= '\udbff':
+        end -= 1
+    return end
+
+
+def _clip_entities(entities, start, end):
+    """Обрезка сущностей по границам части и пересчет смещений."""
+    clipped = []
+    for entity in entities:
+        entity_start = max(entity.offset, start)
+        entity_end = min(entity.offset + entity.length, end)
+        if entity_end > entity_start:
+            # Копируем, чтобы сохранить url у ссылок и language у блоков кода
+            part_entity = copy.copy(entity)
+            part_entity.offset = entity_start - start
+            part_entity.length = entity_end - entity_start
+            clipped.append(part_entity)
+    return clipped
+
+
+def _split(text, entities, first_limit, limit):
+    """Разбиение текста на части с учетом лимитов Telegram."""
+    parts = []
+    start = 0
+    current_limit = first_limit
+    while len(text) - start > current_limit:
+        end = _find_break(text, start, start + current_limit)
+        parts.append((start, end))
+        start = end
+        while start < len(text) and text[start].isspace():
+            start += 1
+        current_limit = limit
+    parts.append((start, len(text)))
+
+    result = []
+    for start, end in parts:
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if end > start:
+            result.append((del_surrogate(text[start:end]), _clip_entities(entities, start, end)))
+    return result
+
+
+def build_post(content, with_media=False):
+    """Подготовка ответа Mistral к отправке в Telegram.
+
+    Возвращает список пар (текст, сущности). Первая часть идет подписью к медиа
+    (не длиннее CAPTION_LIMIT) или обычным сообщением, остальные - отдельными
+    сообщениями не длиннее MESSAGE_LIMIT.
+    """
+    if not content or not content.strip():
+        return []
+
+    text, entities = _format(add_surrogate(content.strip()))
+    first_limit = CAPTION_LIMIT if with_media else MESSAGE_LIMIT
+    parts = _split(text, entities, first_limit, MESSAGE_LIMIT)
+    if len(parts) > 1:
+        logger.info(f"Текст длиной {len(text)} разбит на {len(parts)} части для отправки в Telegram")
+    return parts
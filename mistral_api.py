@@ -1,10 +1,8 @@
 from mistralai import Mistral
-import os
 import asyncio
-from dotenv import load_dotenv
 import logging
+from config import get_config
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
 async def process_content_with_mistral(title, article_content, max_retries=3, initial_delay=2):
@@ -29,24 +27,21 @@ async def process_content_with_mistral(title, article_content, max_retries=3, in
             logger.info(f"Попытка обработки контента через Mistral API #{retry_count+1}")
             # Используем run_in_executor для выполнения блокирующего кода в отдельном потоке
             loop = asyncio.get_event_loop()
+            # Берем снимок настроек, чтобы перезагрузка не изменила их посреди запроса
+            config = get_config()
             
             def process_with_mistral():
                 logger.info("Инициализация клиента Mistral API")
-                client = Mistral(api_key=os.getenv('MISTRAL_API_KEY'))
+                client = Mistral(api_key=config.mistral_api_key)
                 
-                # Получаем промпт из .env и форматируем его с заголовком и содержанием
-                prompt_template = os.getenv('CONTENT_PROMPT')
-                prompt = prompt_template.format(title=title, article_content=article_content)
-                
-                # Получаем модель и максимальное количество токенов из .env
-                model = os.getenv('CONTENT_MODEL', 'mistral-large-latest')
-                max_tokens = int(os.getenv('CONTENT_MAX_TOKENS', 800))
+                # Форматируем промпт с заголовком и содержанием
+                prompt = config.content_prompt.format(title=title, article_content=article_content)
                 
                 logger.info("Отправка запроса к Mistral API для обработки контента")
                 chat_response = client.chat.complete(
-                    model=model,
+                    model=config.content_model,
                     messages=[{"role": "user", "content": prompt}],
-                    max_tokens=max_tokens
+                    max_tokens=config.content_max_tokens
                 )
                 
                 logger.info("Получен ответ от Mistral API")
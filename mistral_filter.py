@@ -1,11 +1,9 @@
 from mistralai import Mistral
-import os
-from dotenv import load_dotenv
 import asyncio
 import time
 import logging
+from config import get_config
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
 async def filter_argentina_content(text, max_retries=3, initial_delay=2):
@@ -20,15 +18,12 @@ async def filter_argentina_content(text, max_retries=3, initial_delay=2):
     while retry_count < max_retries:
         try:
             logger.info(f"Попытка фильтрации #{retry_count+1}")
-            client = Mistral(api_key=os.getenv('MISTRAL_API_KEY_FILTER'))
+            # Берем снимок настроек, чтобы перезагрузка не изменила их посреди запроса
+            config = get_config()
+            client = Mistral(api_key=config.mistral_api_key_filter)
             
-            # Получаем промпт из .env и форматируем его с текстом
-            prompt_template = os.getenv('FILTER_PROMPT')
-            prompt = prompt_template.format(text=text)
-            
-            # Получаем модель и максимальное количество токенов из .env
-            model = os.getenv('FILTER_MODEL', 'mistral-large-latest')
-            max_tokens = int(os.getenv('FILTER_MAX_TOKENS', 10))
+            # Форматируем промпт с текстом
+            prompt = config.filter_prompt.format(text=text)
             
             # Run in an executor to avoid blocking
             loop = asyncio.get_event_loop()
@@ -36,9 +31,9 @@ async def filter_argentina_content(text, max_retries=3, initial_delay=2):
             response = await loop.run_in_executor(
                 None,
                 lambda: client.chat.complete(
-                    model=model,
+                    model=config.filter_model,
                     messages=[{"role": "user", "content": prompt}],
-                    max_tokens=max_tokens
+                    max_tokens=config.filter_max_tokens
                 )
             )
             
@@ -1,11 +1,15 @@
 import asyncio
 import logging
 import os
+import time
+import tempfile
+from unittest import mock
 from telethon import TelegramClient
-from dotenv import load_dotenv
 from mistral_filter import filter_argentina_content
 from mistral_api import process_content_with_mistral
-from bot import process_message, get_entity_safely
+from message_formatter import build_post, CAPTION_LIMIT, MESSAGE_LIMIT
+from config import get_config, set_config, load_config, reload_config
+from bot import process_message, get_entity_safely, send_post
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,13 +22,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Загрузка переменных окружения
-load_dotenv()
-
-# Учетные данные API Telegram
-API_ID = os.getenv('API_ID')
-API_HASH = os.getenv('API_HASH')
-TARGET_GROUP = os.getenv('TARGET_GROUP')
+# Учетные данные API Telegram (из тех же настроек, что использует бот)
+API_ID = get_config().api_id
+API_HASH = get_config().api_hash
+TARGET_GROUP = get_config().target_group
 
 # Тестовые сообщения
 TEST_MESSAGES = [
@@ -122,16 +123,12 @@ async def test_full_pipeline():
         content, media_path, source_info = await process_message(mock_message)
         
         if content:
-            logger.info(f"Сообщение успешно обработано. Контент: {content[:100]}...")
+            logger.info(f"Сообщение успешно обработано. Контент: {content[0][0][:100]}...")
             
             # Опционально: отправка в целевую группу для проверки
             send_to_group = input(f"Отправить обработанное сообщение в {TARGET_GROUP}? (y/n): ").lower() == 'y'
             if send_to_group:
-                await client.send_message(
-                    target_entity,
-                    content,
-                    parse_mode='md'
-                )
+                await send_post(client, target_entity, content)
                 logger.info(f"Сообщение отправлено в {TARGET_GROUP}")
         else:
             logger.info("Сообщение не прошло обработку")
@@ -172,35 +169,24 @@ async def test_publish_news():
             logger.info("Обработка новости через Mistral API...")
             processed_content = await process_content_with_mistral(selected_news['title'], selected_news['text'])
             
-            # Форматируем контент с использованием Markdown
-            lines = processed_content.split('\n')
-            if lines and lines[0]:
-                # Удаляем символы ### из заголовка, если они есть
-                if lines[0].startswith('###'):
-                    lines[0] = lines[0].replace('###', '').strip()
-                
-                # Делаем заголовок полужирным, если он еще не такой
-                if not (lines[0].startswith('**') and lines[0].endswith('**')):
-                    lines[0] = f"**{lines[0]}**"
-                
-                formatted_content = '\n'.join(lines)
-            else:
-                formatted_content = processed_content
+            # Форматируем контент и разбиваем его по лимитам Telegram
+            post = build_post(processed_content)
+            if not post:
+                logger.error("Mistral API вернул пустой текст, публиковать нечего")
+                await client.disconnect()
+                return
             
             # Показываем предварительный просмотр
             print("\n=== Предварительный просмотр новости ===")
-            print(formatted_content)
+            for text, entities in post:
+                print(text)
             print("=======================================\n")
             
             # Подтверждение публикации
             confirm = input("Опубликовать эту новость? (y/n): ").lower() == 'y'
             if confirm:
                 # Публикация в целевую группу
-                await client.send_message(
-                    target_entity,
-                    formatted_content,
-                    parse_mode='md'
-                )
+                await send_post(client, target_entity, post)
                 logger.info(f"Новость успешно опубликована в {TARGET_GROUP}")
             else:
                 logger.info("Публикация отменена пользователем")
@@ -213,6 +199,203 @@ async def test_publish_news():
     
     await client.disconnect()
 
+def _utf16_len(text):
+    """Длина текста в единицах UTF-16, как ее считает Telegram"""
+    return len(text.encode('utf-16-le')) // 2
+
+# Разметка Mistral и ожидаемые сущности: (тип, выделенный текст, url или язык)
+MARKUP_SAMPLE = (
+    "#Аргентина: новости\n"
+    "Источник: [Clarín](https://www.clarin.com), команда `pip install`, ~~старый курс~~\n"
+    "```python\nprint('песо')\n```\n"
+    "**полужирный с *курсивом* внутри** и *курсив с **полужирным** внутри*\n"
+    "## Итоги ***важно***"
+)
+MARKUP_EXPECTED = [
+    ("MessageEntityBold", "#Аргентина: новости", None),
+    ("MessageEntityTextUrl", "Clarín", "https://www.clarin.com"),
+    ("MessageEntityCode", "pip install", None),
+    ("MessageEntityStrike", "старый курс", None),
+    ("MessageEntityPre", "print('песо')", "python"),
+    ("MessageEntityBold", "полужирный с курсивом внутри", None),
+    ("MessageEntityItalic", "курсивом", None),
+    ("MessageEntityItalic", "курсив с полужирным внутри", None),
+    ("MessageEntityBold", "полужирным", None),
+    ("MessageEntityBold", "Итоги важно", None),
+    ("MessageEntityItalic", "важно", None),
+]
+
+def _entity_fragments(text, entities):
+    """Сущности в виде (тип, выделенный текст, url или язык) для сравнения"""
+    encoded = text.encode('utf-16-le')
+    return [
+        (type(entity).__name__,
+         encoded[entity.offset * 2:(entity.offset + entity.length) * 2].decode('utf-16-le'),
+         getattr(entity, 'url', None) or getattr(entity, 'language', None))
+        for entity in entities
+    ]
+
+async def test_formatter_benchmark(iterations=2000):
+    """Микро-бенчмарк форматирования и разбиения текста (без обращения к API)"""
+    logger.info("=== Бенчмарк форматирования ===")
+    
+    # Проверяем разбор разметки, которую раньше обрабатывал parse_mode='md'
+    post = build_post(MARKUP_SAMPLE)
+    if len(post) != 1:
+        raise AssertionError(f"Короткий текст с разметкой разбит на {len(post)} части")
+    text, entities = post[0]
+    fragments = _entity_fragments(text, entities)
+    if fragments != MARKUP_EXPECTED:
+        raise AssertionError(f"Неверно разобрана разметка: {fragments}")
+    if any(marker in text for marker in ("**", "~~", "`", "](", "## ")):
+        raise AssertionError(f"В тексте осталась разметка: {text!r}")
+    logger.info("Разбор разметки проверен")
+    
+    paragraph = ("Президент **Хавьер Милей** представил план по сокращению *государственных расходов* "
+                 "и борьбе с инфляцией 🇦🇷. Эксперты оценивают эти меры как необходимые.")
+    flags = "🇦🇷" * 1500
+    samples = {
+        "короткий": "### **Реформы в Аргентине**\n" + paragraph,
+        "длинный": "### Реформы в Аргентине\n" + "\n\n".join([paragraph] * 40),
+        # Без пробелов и переносов: срабатывает жесткий разрез
+        "без пробелов": "Заголовок\n" + "x" * 5000,
+        "флаги": "Заголовок\n" + flags,
+        "разметка": MARKUP_SAMPLE,
+    }
+    
+    for name, content in samples.items():
+        for with_media in (False, True):
+            post = build_post(content, with_media=with_media)
+            
+            # Проверяем, что все части укладываются в лимиты Telegram
+            limits = [CAPTION_LIMIT if with_media else MESSAGE_LIMIT] + [MESSAGE_LIMIT] * (len(post) - 1)
+            for (text, entities), limit in zip(post, limits):
+                length = _utf16_len(text)
+                if length > limit:
+                    raise AssertionError(f"Текст '{name}': часть длиной {length} превышает лимит {limit}")
+                for entity in entities:
+                    if entity.offset + entity.length > length:
+                        raise AssertionError(f"Текст '{name}': сущность {entity} выходит за границы части длиной {length}")
+            
+            if name == "флаги":
+                # Флаги не должны разрезаться между региональными индикаторами
+                rest = "".join(text for text, entities in post)[len("Заголовок"):].lstrip()
+                if rest != flags or any(not text.startswith(("🇦🇷", "Заголовок")) for text, entities in post):
+                    raise AssertionError("Флаг 🇦🇷 разрезан при разбиении текста")
+            
+            # Логирование внутри build_post исказило бы замер
+            formatter_logger = logging.getLogger('message_formatter')
+            previous_level = formatter_logger.level
+            formatter_logger.setLevel(logging.WARNING)
+            try:
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    build_post(content, with_media=with_media)
+                elapsed = (time.perf_counter() - start) / iterations * 1_000_000
+            finally:
+                formatter_logger.setLevel(previous_level)
+            
+            logger.info(f"Текст '{name}' ({len(content)} симв.), медиа: {with_media}, "
+                        f"частей: {len(post)}, {elapsed:.1f} мкс на вызов")
+
+# Минимальный корректный набор настроек для проверки config.py
+TEST_ENV = {
+    "API_ID": "12345",
+    "API_HASH": "hash",
+    "SOURCE_GROUPS": "group_a, group_b",
+    "TARGET_GROUP": "target",
+    "MISTRAL_API_KEY": "key",
+    "MISTRAL_API_KEY_FILTER": "filter_key",
+    "FILTER_PROMPT": "Текст: {text}",
+    "CONTENT_PROMPT": "Заголовок: {title} Текст: {article_content}",
+}
+
+def _write_env(path, **overrides):
+    """Запись тестового .env; значение None убирает ключ"""
+    values = dict(TEST_ENV, **overrides)
+    with open(path, "w", encoding="utf-8") as f:
+        for key, value in values.items():
+            if value is not None:
+                f.write(f'{key}="{value}"\n')
+
+def _expect_invalid(path, description):
+    """Проверка, что load_config отклоняет некорректные настройки"""
+    try:
+        load_config(path)
+    except ValueError as e:
+        logger.info(f"{description}: отклонено ({e})")
+    else:
+        raise AssertionError(f"{description}: некорректные настройки приняты")
+
+async def test_config_reload():
+    """Проверка чтения и перезагрузки настроек на временном .env (без обращения к API)"""
+    logger.info("=== Тестирование настроек ===")
+    
+    previous_config = get_config()
+    applied = []
+    
+    async def on_reload(old_config, new_config):
+        applied.append(new_config)
+        # Имитируем бота, которому не удалось подключиться к group_c
+        return new_config._replace(source_groups=tuple(g for g in new_config.source_groups if g != "group_c"))
+    
+    async def failing_reload(old_config, new_config):
+        raise RuntimeError("ошибка применения")
+    
+    # Переменные окружения имеют приоритет над файлом, поэтому убираем их на время проверки
+    with tempfile.TemporaryDirectory() as tmp_dir, mock.patch.dict(os.environ, clear=True):
+        path = os.path.join(tmp_dir, ".env")
+        try:
+            _write_env(path)
+            config = load_config(path)
+            if config.source_groups != ("group_a", "group_b") or config.content_max_tokens != 800:
+                raise AssertionError(f"Неверно прочитаны настройки: {config}")
+            
+            _write_env(path, MISTRAL_API_KEY=None)
+            _expect_invalid(path, "Нет обязательного ключа")
+            _write_env(path, FILTER_PROMPT="Текст: {txt}")
+            _expect_invalid(path, "Неверный плейсхолдер в промпте")
+            _write_env(path, CONTENT_MAX_TOKENS="0")
+            _expect_invalid(path, "Неположительный лимит токенов")
+            
+            os.environ["TARGET_GROUP"] = "from_env"
+            _write_env(path)
+            if load_config(path).target_group != "from_env":
+                raise AssertionError("Переменная окружения не перекрыла значение из файла")
+            del os.environ["TARGET_GROUP"]
+            
+            # Некорректный файл не меняет текущие настройки
+            set_config(config)
+            _write_env(path, CONTENT_MAX_TOKENS="-1")
+            if await reload_config(on_reload, path) is not None or get_config() != config:
+                raise AssertionError("Некорректный файл изменил текущие настройки")
+            
+            # Смена API_ID откатывается, остальные изменения применяются
+            _write_env(path, API_ID="999", CONTENT_MODEL="mistral-small-latest")
+            await reload_config(on_reload, path)
+            if get_config().api_id != "12345" or get_config().content_model != "mistral-small-latest":
+                raise AssertionError(f"Неверно применена смена API_ID: {get_config()}")
+            
+            # Сохраняются фактически примененные группы, повторное чтение пробует снова
+            _write_env(path, API_ID="999", CONTENT_MODEL="mistral-small-latest", SOURCE_GROUPS="group_a,group_c")
+            await reload_config(on_reload, path)
+            if get_config().source_groups != ("group_a",):
+                raise AssertionError(f"Сохранены непримененные группы: {get_config().source_groups}")
+            attempts = len(applied)
+            await reload_config(on_reload, path)
+            if len(applied) != attempts + 1:
+                raise AssertionError("Повторное чтение того же файла не попыталось применить группы")
+            
+            # Ошибка при применении оставляет старые настройки
+            current = get_config()
+            _write_env(path, CONTENT_MODEL="mistral-medium-latest")
+            if await reload_config(failing_reload, path) is not None or get_config() != current:
+                raise AssertionError("Настройки сохранены, хотя применить их не удалось")
+        finally:
+            set_config(previous_config)
+    
+    logger.info("Проверка настроек пройдена")
+
 async def main():
     """Основная функция для запуска тестов"""
     logger.info("Начало тестирования бота")
@@ -223,9 +406,11 @@ async def main():
     print("2. Тест обработки контента")
     print("3. Тест полного процесса")
     print("4. Тест публикации новости в целевую группу")
-    print("5. Запустить все тесты")
+    print("5. Бенчмарк форматирования")
+    print("6. Тест настроек и их перезагрузки")
+    print("7. Запустить все тесты")
     
-    choice = input("Введите номер теста (1-5): ")
+    choice = input("Введите номер теста (1-7): ")
     
     if choice == '1':
         await test_filter_function()
@@ -236,10 +421,16 @@ async def main():
     elif choice == '4':
         await test_publish_news()
     elif choice == '5':
+        await test_formatter_benchmark()
+    elif choice == '6':
+        await test_config_reload()
+    elif choice == '7':
         await test_filter_function()
         await test_process_content()
         await test_full_pipeline()
         await test_publish_news()
+        await test_formatter_benchmark()
+        await test_config_reload()
     else:
         logger.error("Неверный выбор")
     